@@ -1,10 +1,10 @@
 """Module to handle journalisering functionality in GetOrganized."""
 from mbu_dev_shared_components.getorganized import objects
-from mbu_dev_shared_components.getorganized import cases
-from mbu_dev_shared_components.getorganized import contacts
 
+from robot_framework.case_manager.go_api_client import GoApiClient, FORM_HEADERS
 
-class CaseHandler:
+
+class CaseHandler(GoApiClient):
     """
     A class to manage the creation of cases in the GetOrganized system.
 
@@ -13,25 +13,9 @@ class CaseHandler:
     - api_password (str): The password for GetOrganized API.
     """
     def __init__(self, api_endpoint: str, api_username: str, api_password: str):
-        self.api_username = api_username
-        self.api_password = api_password
-        self.api_endpoint = api_endpoint
+        super().__init__(api_endpoint, api_username, api_password)
         self.case_obj = objects.CaseDataJson()
 
-    def _get_full_endpoint(self, path: str):
-        """
-        Constructs the full endpoint URL.
-
-        Parameters:
-        - path (str): The specific path for the API endpoint.
-
-        Returns:
-        - str: The full endpoint URL.
-        """
-        if path:
-            return f"{self.api_endpoint}{path}"
-        return self.api_endpoint
-
     def create_case_folder_data(
         self,
         case_type_prefix: objects.CaseTypePrefix,
@@ -115,13 +99,7 @@ class CaseHandler:
         Parameters:
         - case_folder_search_data (str): JSON string of search data.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
-
-        return cases.find_case_by_case_properties(
-            case_folder_search_data,
-            endpoint,
-            self.api_username,
-            self.api_password)
+        return self._post(endpoint_path, json=case_folder_search_data, idempotent=True)
 
     def create_case_folder(self, case_folder_data: str, endpoint_path: str):
         """
@@ -130,9 +108,7 @@ class CaseHandler:
         Parameters:
         - case_data (str): JSON string of case data.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
-
-        return cases.create_case_folder(case_folder_data, endpoint, self.api_username, self.api_password)
+        return self._post(endpoint_path, json=case_folder_data)
 
     def create_case(self, case_data: str, endpoint_path: str):
         """
@@ -141,9 +117,7 @@ class CaseHandler:
         Parameters:
         - case_data (str): JSON string of case data.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
-
-        return cases.create_case(case_data, endpoint, self.api_username, self.api_password)
+        return self._post(endpoint_path, json=case_data)
 
     def contact_lookup(self, person_ssn: str, endpoint_path: str):
         """
@@ -156,10 +130,6 @@ class CaseHandler:
         Returns:
         - str: JSON string of the contact information.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
+        body = {"Id": person_ssn, "ContactDataFieldName": "CCMContactData"}
 
-        return contacts.contact_lookup(
-            person_ssn=person_ssn,
-            api_endpoint=endpoint,
-            api_username=self.api_username,
-            api_password=self.api_password)
+        return self._post(endpoint_path, headers=FORM_HEADERS, data=body, idempotent=True)
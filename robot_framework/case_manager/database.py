@@ -0,0 +1,254 @@
+"""
+This module handles the database access made during the journalization process.
+Connections are kept in a pool between calls and every distinct stored procedure call gets its
+own cursor per connection, so pyodbc only prepares the statement the first time it is executed.
+"""
+import json
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from dateutil import parser
+import pyodbc
+
+from robot_framework import config
+
+
+_TYPE_MAPPING = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "datetime": parser.isoparse,
+    "json": lambda x: json.dumps(x, ensure_ascii=False)
+}
+
+
+class _SpConnection:
+    """A pooled pyodbc connection that keeps one prepared cursor per stored procedure call."""
+    def __init__(self, connection_string: str):
+        self.connection = pyodbc.connect(connection_string, autocommit=True)
+        self._cursors = {}
+
+    def cursor(self) -> pyodbc.Cursor:
+        """Return a new plain cursor for ad-hoc queries."""
+        return self.connection.cursor()
+
+    def cursor_for(self, sql: str) -> pyodbc.Cursor:
+        """Return the cursor used for the given SQL, creating it on first use."""
+        cursor = self._cursors.get(sql)
+        if cursor is None:
+            cursor = self.connection.cursor()
+            cursor.fast_executemany = True
+            self._cursors[sql] = cursor
+        return cursor
+
+    def close(self) -> None:
+        """Close all cursors and the underlying connection."""
+        for cursor in self._cursors.values():
+            cursor.close()
+        self._cursors.clear()
+        self.connection.close()
+
+
+_POOLS: Dict[str, queue.LifoQueue] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(connection_string: str) -> queue.LifoQueue:
+    """Return the pool of idle connections for the connection string."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(connection_string)
+        if pool is None:
+            pool = queue.LifoQueue(maxsize=config.DB_POOL_SIZE)
+            _POOLS[connection_string] = pool
+        return pool
+
+
+def _close_quietly(sp_connection: _SpConnection) -> None:
+    """Close a connection, ignoring errors from an already broken connection."""
+    try:
+        sp_connection.close()
+    except pyodbc.Error:
+        pass
+
+
+@contextmanager
+def get_connection(connection_string: str) -> Iterator[_SpConnection]:
+    """
+    Borrow a connection from the pool, opening a new one if none are idle.
+    The connection is returned to the pool afterwards, unless it raised a pyodbc error.
+
+    Args:
+        connection_string (str): Connection string for the database.
+
+    Yields:
+        _SpConnection: The borrowed connection.
+    """
+    pool = _get_pool(connection_string)
+    try:
+        sp_connection = pool.get_nowait()
+    except queue.Empty:
+        sp_connection = _SpConnection(connection_string)
+
+    broken = False
+    try:
+        yield sp_connection
+    except pyodbc.Error:
+        broken = True
+        raise
+    finally:
+        if broken:
+            _close_quietly(sp_connection)
+        else:
+            try:
+                pool.put_nowait(sp_connection)
+            except queue.Full:
+                _close_quietly(sp_connection)
+
+
+def close_connections() -> None:
+    """Close all idle pooled connections."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        while True:
+            try:
+                _close_quietly(pool.get_nowait())
+            except queue.Empty:
+                break
+
+
+def _build_sql(stored_procedure: str, params: Dict[str, tuple]) -> str:
+    """Build the EXEC statement for the stored procedure and parameter names."""
+    param_placeholders = ', '.join([f"@{key} = ?" for key in params.keys()])
+    return f"EXEC {stored_procedure} {param_placeholders}"
+
+
+def _convert_params(params: Dict[str, tuple]) -> Tuple[Any, ...]:
+    """Convert {param_name: (param_type, param_value)} to the values passed to pyodbc."""
+    param_values = []
+    for value in params.values():
+        if not (isinstance(value, tuple) and len(value) == 2):
+            raise ValueError("Each parameter value must be a tuple of (type, actual_value).")
+        value_type, actual_value = value
+        if value_type in _TYPE_MAPPING:
+            param_values.append(_TYPE_MAPPING[value_type](actual_value))
+        else:
+            param_values.append(actual_value)
+    return tuple(param_values)
+
+
+def _input_sizes(row: Tuple[Any, ...]) -> List[Optional[tuple]]:
+    """
+    Bind string parameters as NVARCHAR(MAX), so fast_executemany doesn't size its buffers
+    from the first row and the statement isn't re-prepared for every distinct string length.
+    """
+    return [(pyodbc.SQL_WVARCHAR, 0, 0) if isinstance(value, str) else None for value in row]
+
+
+def _run(connection_string: str, sql: str, rows: List[Tuple[Any, ...]]) -> Dict[str, Union[bool, str, None]]:
+    """Execute the SQL once per row of parameters on a pooled (autocommit) connection."""
+    result = {
+        "success": False,
+        "error_message": None,
+    }
+
+    try:
+        with get_connection(connection_string) as sp_connection:
+            cursor = sp_connection.cursor_for(sql)
+            if len(rows) == 1:
+                cursor.execute(sql, rows[0])
+                # Step through the results of every statement, so errors in a batch are raised
+                while cursor.nextset():
+                    pass
+            else:
+                cursor.setinputsizes(_input_sizes(rows[0]))
+                cursor.executemany(sql, rows)
+        result["success"] = True
+    except pyodbc.Error as e:
+        result["error_message"] = f"Database error: {str(e)}"
+    except Exception as e:
+        result["error_message"] = f"An unexpected error occurred: {str(e)}"
+
+    return result
+
+
+def execute_stored_procedure(connection_string: str, stored_procedure: str, params: Dict[str, tuple]) -> Dict[str, Union[bool, str, None]]:
+    """
+    Execute a stored procedure with the given parameters.
+    Drop-in replacement for the shared component function of the same name, using pooled connections and cursors.
+
+    Args:
+        connection_string (str): Connection string for the database.
+        stored_procedure (str): Name of the stored procedure to execute.
+        params (Dict[str, tuple]):
+            Parameters for the SQL procedure, in the form {param_name: (param_type, param_value)}.
+
+    Returns:
+        Dict[str, Union[bool, str, None]]: A dictionary with the success status and an error message (if any).
+    """
+    return execute_stored_procedure_many(connection_string, stored_procedure, [params])
+
+
+def execute_stored_procedure_many(
+        connection_string: str,
+        stored_procedure: str,
+        params_list: List[Dict[str, tuple]]
+        ) -> Dict[str, Union[bool, str, None]]:
+    """
+    Execute a stored procedure once per parameter set in a single executemany call.
+    All parameter sets must have the same parameter names in the same order.
+
+    Args:
+        connection_string (str): Connection string for the database.
+        stored_procedure (str): Name of the stored procedure to execute.
+        params_list (List[Dict[str, tuple]]): The parameter sets, each in the form {param_name: (param_type, param_value)}.
+
+    Returns:
+        Dict[str, Union[bool, str, None]]: A dictionary with the success status and an error message (if any).
+    """
+    if not params_list:
+        return {"success": True, "error_message": None}
+
+    try:
+        sql = _build_sql(stored_procedure, params_list[0])
+        rows = [_convert_params(params) for params in params_list]
+    except ValueError as e:
+        return {"success": False, "error_message": f"Value error: {str(e)}"}
+
+    return _run(connection_string, sql, rows)
+
+
+def execute_stored_procedure_batch(
+        connection_string: str,
+        calls: List[Tuple[str, Dict[str, tuple]]]
+        ) -> Dict[str, Union[bool, str, None]]:
+    """
+    Execute several stored procedure calls as one T-SQL batch in a single round trip.
+    The calls run in one transaction that is rolled back and re-raised on any error, so either all of them
+    or none are applied. No SET options are used, as they would stay on the pooled connection.
+
+    Args:
+        connection_string (str): Connection string for the database.
+        calls (List[Tuple[str, Dict[str, tuple]]]):
+            The calls as (stored_procedure, params), with params in the form {param_name: (param_type, param_value)}.
+
+    Returns:
+        Dict[str, Union[bool, str, None]]: A dictionary with the success status and an error message (if any).
+    """
+    if not calls:
+        return {"success": True, "error_message": None}
+
+    try:
+        statements = [_build_sql(stored_procedure, params) for stored_procedure, params in calls]
+        param_values = tuple(value for _, params in calls for value in _convert_params(params))
+    except ValueError as e:
+        return {"success": False, "error_message": f"Value error: {str(e)}"}
+
+    sql = (
+        "BEGIN TRY BEGIN TRANSACTION; " + "; ".join(statements) + "; COMMIT TRANSACTION; END TRY "
+        "BEGIN CATCH IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION; THROW; END CATCH;"
+    )
+    return _run(connection_string, sql, [param_values])
@@ -1,9 +1,12 @@
 """Module to handle document journalisering functionality in GetOrganized."""
+import base64
+
 from mbu_dev_shared_components.getorganized import objects
-from mbu_dev_shared_components.getorganized import documents
+
+from robot_framework.case_manager.go_api_client import GoApiClient
 
 
-class DocumentHandler:
+class DocumentHandler(GoApiClient):
     """
     A class to manage the jouranlizing of documents in the GetOrganized system.
 
@@ -12,29 +15,13 @@ class DocumentHandler:
     - api_password (str): The password for GetOrganized API.
     """
     def __init__(self, api_endpoint: str, api_username: str, api_password: str):
-        self.api_username = api_username
-        self.api_password = api_password
-        self.api_endpoint = api_endpoint
+        super().__init__(api_endpoint, api_username, api_password)
         self.document_obj = objects.DocumentJsonCreator()
 
-    def _get_full_endpoint(self, path: str):
-        """
-        Constructs the full endpoint URL.
-
-        Parameters:
-        - path (str): The specific path for the API endpoint.
-
-        Returns:
-        - str: The full endpoint URL.
-        """
-        if path:
-            return f"{self.api_endpoint}{path}"
-        return self.api_endpoint
-
     def create_document_metadata(self,
                                  case_id: int,
                                  filename: str,
-                                 data_in_bytes: bytes,
+                                 data_in_bytes: bytes | memoryview,
                                  overwrite: bool,
                                  list_name: str = "Dokumenter",
                                  folder_path: str = "",
@@ -45,6 +32,8 @@ class DocumentHandler:
                                  ):
         """
         Creates JSON data for a document.
+        The file content is base64 encoded straight from the given bytes instead of being
+        expanded into a list of ints, so the returned data can be reused when an upload is retried.
 
         Returns:
         - str: JSON string of document data.
@@ -58,7 +47,9 @@ class DocumentHandler:
             + '/>'
         )
 
-        return self.document_obj.document_data_json(case_id, list_name, folder_path, filename, xml_document_metadata, overwrite, data_in_bytes)
+        encoded_bytes = base64.b64encode(data_in_bytes).decode('ascii')
+
+        return self.document_obj.document_data_json(case_id, list_name, folder_path, filename, xml_document_metadata, overwrite, encoded_bytes)
 
     def upload_document(self, document_data: str, endpoint_path: str):
         """
@@ -67,9 +58,7 @@ class DocumentHandler:
         Parameters:
         - document metadata (str): A JSON string containing file data of the document to be uploaded.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
-
-        return documents.upload_file_to_case(document_data, endpoint, self.api_username, self.api_password)
+        return self._post(endpoint_path, json=document_data)
 
     def journalize_document(self, document_ids: list, endpoint_path: str):
         """
@@ -78,9 +67,10 @@ class DocumentHandler:
         Parameters:
         - document_ids (list): List of ids on the documents to journalize.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
+        response = self._post(endpoint_path, json={"DocumentIds": document_ids})
+        response.raise_for_status()
 
-        return documents.mark_file_as_case_record(document_ids, endpoint, self.api_username, self.api_password)
+        return response
 
     def finalize_document(self, document_ids: list, endpoint_path: str):
         """
@@ -89,6 +79,7 @@ class DocumentHandler:
         Parameters:
         - document_ids (list): List of ids on the documents to finalize.
         """
-        endpoint = self._get_full_endpoint(endpoint_path)
+        response = self._post(endpoint_path, json={"DocumentIds": document_ids, "ShouldCloseOpenTasks": False})
+        response.raise_for_status()
 
-        return documents.finalize_file(document_ids, endpoint, self.api_username, self.api_password)
+        return response
@@ -0,0 +1,117 @@
+"""Module with the shared HTTP plumbing for the GetOrganized API handlers."""
+import threading
+import time
+
+import orjson
+import requests
+
+from mbu_dev_shared_components.getorganized.auth import get_ntlm_go_api_credentials
+
+from robot_framework.case_manager.http_session import get_session
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+REQUEST_TIMEOUT = 60
+
+# Read-only calls are retried on these transient errors, with exponential backoff
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class GoApiClient:  # pylint: disable=too-few-public-methods
+    """
+    Base class for the GetOrganized API handlers.
+    The NTLM auth object is built once per handler and thread instead of once per request,
+    and all requests go through the session of the calling thread to reuse open connections.
+    A handler may be used from several threads, e.g. by the document upload workers of a form.
+
+    Attributes:
+    - api_endpoint (str): The base URL of the GetOrganized API.
+    - api_username (str): The username for GetOrganized API.
+    - api_password (str): The password for GetOrganized API.
+    """
+    def __init__(self, api_endpoint: str, api_username: str, api_password: str):
+        self.api_username = api_username
+        self.api_password = api_password
+        self.api_endpoint = api_endpoint
+        self._thread_auth = threading.local()
+
+    def _get_auth(self):
+        """
+        Returns the NTLM auth object of the calling thread, creating it on first use.
+        HttpNtlmAuth stores the security context of its latest handshake, so threads must not share one.
+
+        Returns:
+        - HttpNtlmAuth: The NTLM auth object for the GetOrganized API.
+        """
+        auth = getattr(self._thread_auth, "auth", None)
+        if auth is None:
+            auth = get_ntlm_go_api_credentials(self.api_username, self.api_password)
+            self._thread_auth.auth = auth
+        return auth
+
+    def _get_full_endpoint(self, path: str):
+        """
+        Constructs the full endpoint URL.
+
+        Parameters:
+        - path (str): The specific path for the API endpoint.
+
+        Returns:
+        - str: The full endpoint URL.
+        """
+        if path:
+            return f"{self.api_endpoint}{path}"
+        return self.api_endpoint
+
+    def _post(
+        self,
+        endpoint_path: str,
+        headers: dict = None,
+        json: dict = None,
+        idempotent: bool = False,
+        **kwargs
+    ) -> requests.Response:
+        """
+        Sends a POST request to the GetOrganized API.
+
+        Parameters:
+        - endpoint_path (str): The specific path for the API endpoint.
+        - headers (dict): Request headers. Defaults to JSON headers.
+        - json (dict): Payload sent as the JSON body, encoded with orjson.
+        - idempotent (bool): Whether the call only reads data. Such calls are retried on
+          connection errors, timeouts and RETRY_STATUS_CODES, as repeating them is safe.
+          Up to RETRY_ATTEMPTS attempts are made, with RETRY_BACKOFF_SECONDS doubled between them.
+          Other calls are sent once.
+
+        This is the only retry of POST responses. The urllib3 retry of the session is a separate layer:
+        it retries 502/503/504 only for GET and the other idempotent methods, never POST, so it does not multiply these attempts,
+        but it does retry failures to open a connection, also below each attempt made here.
+        - kwargs: Passed on to requests, e.g. data.
+
+        Returns:
+        - requests.Response: The response object from the API.
+        """
+        endpoint = self._get_full_endpoint(endpoint_path)
+        if json is not None:
+            kwargs["data"] = orjson.dumps(json)
+        attempts = RETRY_ATTEMPTS if idempotent else 1
+
+        for attempt in range(1, attempts + 1):
+            try:
+                response = get_session().post(
+                    endpoint,
+                    headers=headers or JSON_HEADERS,
+                    auth=self._get_auth(),
+                    timeout=REQUEST_TIMEOUT,
+                    **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts:
+                    raise
+            else:
+                if attempt == attempts or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        return response
@@ -6,10 +6,22 @@ import os
 from typing import Dict, List, Union
 from urllib.parse import urlparse, unquote
 import json
+from functools import lru_cache
+from contextlib import closing
 from io import BytesIO
 import pyodbc
 from itk_dev_shared_components.smtp import smtp_util
 
+from robot_framework.case_manager.database import get_connection
+from robot_framework.case_manager.http_session import get_session
+
+
+_URL_PATTERN = re.compile(
+    r'^(https?://)?'
+    r'([a-z0-9]+([\-\.]{1}[a-z0-9]+)*\.[a-z]{2,6})'
+    r'(:[0-9]{1,5})?'
+    r'(/.*)?$', re.IGNORECASE)
+
 
 def _is_url(string: str) -> bool:
     """
@@ -21,12 +33,32 @@ def _is_url(string: str) -> bool:
     Returns:
         bool: True if the string is a valid URL, False otherwise.
     """
-    url_pattern = re.compile(
-        r'^(https?://)?'
-        r'([a-z0-9]+([\-\.]{1}[a-z0-9]+)*\.[a-z]{2,6})'
-        r'(:[0-9]{1,5})?'
-        r'(/.*)?$', re.IGNORECASE)
-    return re.match(url_pattern, string) is not None
+    # Every URL the pattern accepts has a dot in its host, so most plain form values are rejected without the regex
+    return '.' in string and _URL_PATTERN.match(string) is not None
+
+
+def download_file_bytes(url: str, os2_api_key: str) -> bytes:
+    """
+    Download the content of a file from OS2Forms using the session of the calling thread.
+
+    Args:
+        url (str): The URL from which the file will be downloaded.
+        os2_api_key (str): The API-key for the OS2Forms api.
+
+    Returns:
+        bytes: The content of the file.
+
+    Raises:
+        requests.RequestException: If the HTTP request fails for any reason.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'api-key': os2_api_key
+    }
+    response = get_session().get(url, headers=headers, timeout=60)
+    response.raise_for_status()
+
+    return response.content
 
 
 def find_urls(data: Union[Dict[str, Union[str, dict, list]], list]) -> List[str]:
@@ -125,11 +157,7 @@ def extract_filename_from_url_without_extension(url: str) -> str:
     Returns:
         str: The extracted filename without extension.
     """
-    parsed_url = urlparse(url)
-    path_segments = parsed_url.path.split('/')
-    filename = path_segments[-1]
-    original_filename = unquote(filename)
-    filename_without_extension, _ = os.path.splitext(original_filename)
+    filename_without_extension, _ = os.path.splitext(extract_filename_from_url(url))
     return filename_without_extension
 
 
@@ -207,46 +235,52 @@ def extract_key_value_pairs_from_json(json_data, node_name=None, separator=";#",
 def fetch_case_metadata(connection_string, os2formwebform_id):
     """Retrieve metadata for a specific os2formWebformId."""
     try:
-        with pyodbc.connect(connection_string) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT os2formWebformId, caseType, spUpdateResponseData,
-                spUpdateProcessStatus, caseData, documentData
-                FROM [RPA].[journalizing].[Metadata]
-                WHERE os2formWebformId = ?;""",
-                (os2formwebform_id,)
-            )
-            row = cursor.fetchone()
-            if row is not None:
-
-                try:
-                    case_data_parsed = json.loads(row.caseData) if row.caseData else None
-                    document_data_parsed = json.loads(row.documentData) if row.documentData else None
-
-                    # Clean up the case data by removing non-breaking spaces
-                    case_data_parsed = {
-                        key: value.replace('\xa0', '')
-                        if isinstance(value, str)
-                        else value for key, value in case_data_parsed.items()}
-
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing JSON data: {e}")
-                    case_data_parsed = None
-                    document_data_parsed = None
-
-                case_metadata = {
-                    'os2formWebformId': row.os2formWebformId,
-                    'caseType': row.caseType,
-                    'spUpdateResponseData': row.spUpdateResponseData,
-                    'spUpdateProcessStatus': row.spUpdateProcessStatus,
-                    'caseData': case_data_parsed,
-                    'documentData': document_data_parsed
-                }
-                return case_metadata
-
-            print("No data found for the given os2formWebformId.")
-            return None
+        with get_connection(connection_string) as conn:
+            # Close the cursor before the connection goes back to the pool, so no open result set is handed on
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(
+                    """
+                    SELECT os2formWebformId, caseType, spUpdateResponseData,
+                    spUpdateProcessStatus, caseData, documentData
+                    FROM [RPA].[journalizing].[Metadata]
+                    WHERE os2formWebformId = ?;""",
+                    (os2formwebform_id,)
+                )
+                row = cursor.fetchone()
+
+        if row is not None:
+
+            try:
+                case_data_parsed = json.loads(row.caseData) if row.caseData else None
+                document_data_parsed = json.loads(row.documentData) if row.documentData else None
+
+                # Clean up the case data by removing non-breaking spaces
+                case_data_parsed = {
+                    key: value.replace('\xa0', '')
+                    if isinstance(value, str)
+                    else value for key, value in case_data_parsed.items()}
+
+            except json.JSONDecodeError as e:
+                print(f"Error parsing JSON data: {e}")
+                case_data_parsed = None
+                document_data_parsed = None
+
+            case_metadata = {
+                'os2formWebformId': row.os2formWebformId,
+                'caseType': row.caseType,
+                'spUpdateResponseData': row.spUpdateResponseData,
+                'spUpdateProcessStatus': row.spUpdateProcessStatus,
+                'caseData': case_data_parsed,
+                'documentData': document_data_parsed,
+                # Parsed once here, as it is the same for every form of the webform
+                'documentCategories': extract_key_value_pairs_from_json(
+                    document_data_parsed,
+                    node_name="documentCategory") if document_data_parsed else {}
+            }
+            return case_metadata
+
+        print("No data found for the given os2formWebformId.")
+        return None
 
     except pyodbc.Error as e:
         print(f"Database error: {e}")
@@ -256,6 +290,12 @@ def fetch_case_metadata(connection_string, os2formwebform_id):
         return None
 
 
+@lru_cache(maxsize=16)
+def _get_constant_value(orchestrator_connection, constant_name: str) -> str:
+    """Return the value of an OpenOrchestrator constant. Cached, as constants don't change during a run."""
+    return orchestrator_connection.get_constant(constant_name).value
+
+
 def notify_stakeholders(
         case_metadata,
         case_id,
@@ -267,7 +307,7 @@ def notify_stakeholders(
     """Notify stakeholders about the journalized case."""
     try:
         form_type = case_metadata["os2formWebformId"]
-        email_sender = orchestrator_connection.get_constant("e-mail_noreply").value
+        email_sender = _get_constant_value(orchestrator_connection, "e-mail_noreply")
         email_subject = None
         email_body = None
         email_recipient = None
@@ -279,7 +319,7 @@ def notify_stakeholders(
         ) if case_rel_url else None
 
         if error_message:
-            email_recipient = orchestrator_connection.get_constant("Error Email").value
+            email_recipient = _get_constant_value(orchestrator_connection, "Error Email")
             email_subject = "Fejl ved journalisering af sag"
             email_body = (
                 f"<p>Der opstod en fejl ved journalisering af en sag.</p>"
@@ -331,8 +371,8 @@ def notify_stakeholders(
                 subject=email_subject,
                 body=email_body,
                 html_body=email_body,
-                smtp_server=orchestrator_connection.get_constant("smtp_server").value,
-                smtp_port=orchestrator_connection.get_constant("smtp_port").value,
+                smtp_server=_get_constant_value(orchestrator_connection, "smtp_server"),
+                smtp_port=_get_constant_value(orchestrator_connection, "smtp_port"),
                 attachments=attachments if attachments else None
             )
             orchestrator_connection.log_trace("Notification sent to stakeholder")
@@ -0,0 +1,43 @@
+"""
+This module holds the HTTP sessions used for all calls to the GetOrganized and OS2Forms APIs,
+so connections are kept alive and reused across requests, handlers and forms.
+Every thread gets its own session: NTLM authenticates a single connection over several requests,
+so a connection must not be handed to another thread in the middle of the handshake.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from robot_framework import config
+
+
+_THREAD_SESSIONS = threading.local()
+
+
+def _create_session() -> requests.Session:
+    """
+    Create a session with pooled keep-alive connections that retries transient gateway errors.
+    urllib3 only retries the status codes for idempotent methods like GET, so POSTs to GetOrganized
+    are retried by GoApiClient._post instead.
+    """
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(
+        pool_connections=config.HTTP_POOL_SIZE,
+        pool_maxsize=config.HTTP_POOL_SIZE,
+        max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the session of the current thread, creating it on first use."""
+    session = getattr(_THREAD_SESSIONS, "session", None)
+    if session is None:
+        session = _create_session()
+        _THREAD_SESSIONS.session = session
+    return session
@@ -2,20 +2,29 @@
 This module handles the journalization process for case management.
 It contains functionality to upload and journalize documents, and manage case data.
 """
-import json
+import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache, partial
 from typing import Dict, Any, Optional, List, Tuple
+import orjson
 import pyodbc
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
-from mbu_dev_shared_components.utils.db_stored_procedure_executor import execute_stored_procedure
-from mbu_dev_shared_components.os2forms.documents import download_file_bytes
+from robot_framework import config
+from robot_framework.case_manager.database import (
+    execute_stored_procedure,
+    execute_stored_procedure_batch,
+    execute_stored_procedure_many,
+    get_connection
+)
 from robot_framework.case_manager.helper_functions import (
+    download_file_bytes,
     extract_filename_from_url,
     find_name_url_pairs,
-    extract_key_value_pairs_from_json,
-    notify_stakeholders,
-    extract_filename_from_url_without_extension
+    notify_stakeholders
 )
 
 
@@ -27,22 +36,70 @@ class RequestError(Exception):
     """Custom exception for request related errors."""
 
 
-def execute_sql_update(conn_string: str, procedure_name: str, params: Dict[str, tuple]) -> None:
+class StepRecorder:
     """
-    Execute a stored procedure to update data in the database.
-
-    Args:
-        conn_string (str): Connection string for the database.
-        procedure_name (str): Name of the stored procedure to execute.
-        params (Dict[str, tuple]):
-            Parameters for the SQL procedure, in the form {param_name: (param_type, param_value)}.
+    Collects the response data of each step for a single form and writes it
+    to the database with one executemany call, once the case is created and when the form is done.
 
-    Raises:
-        DatabaseError: If the SQL procedure execution fails.
+    Attributes:
+    - conn_string (str): Connection string for the database.
+    - procedure_name (str): Name of the stored procedure that stores the response data.
+    - form_id (str): The id of the form the steps belong to.
     """
-    sql_update_result = execute_stored_procedure(conn_string, procedure_name, params)
-    if not sql_update_result['success']:
-        raise DatabaseError(f"SQL - {procedure_name} failed.")
+    def __init__(self, conn_string: str, procedure_name: str, form_id: str):
+        self.conn_string = conn_string
+        self.procedure_name = procedure_name
+        self.form_id = form_id
+        self._rows: List[Dict[str, tuple]] = []
+
+    def record(self, step_name: str, json_fragment: Any) -> None:
+        """
+        Queue the response data of a step.
+
+        Args:
+            step_name (str): The name of the step, e.g. "ContactLookup".
+            json_fragment (Any): JSON serializable data to store for the step.
+        """
+        self._rows.append({
+            "StepName": ("str", step_name),
+            "JsonFragment": ("str", orjson.dumps(json_fragment).decode()),
+            "form_id": ("str", self.form_id)
+        })
+
+    def flush(self) -> None:
+        """
+        Write all queued step data to the database.
+
+        Raises:
+            DatabaseError: If the SQL procedure execution fails.
+        """
+        if not self._rows:
+            return
+
+        sql_update_result = execute_stored_procedure_many(self.conn_string, self.procedure_name, self._rows)
+        if not sql_update_result['success']:
+            raise DatabaseError(f"SQL - {self.procedure_name} failed.")
+        self._rows = []
+
+    def complete(self, status_procedure: str, status_params: Dict[str, tuple]) -> None:
+        """
+        Write all queued step data together with the final status of the form,
+        as one batch in a single round trip and transaction.
+
+        Args:
+            status_procedure (str): Name of the stored procedure that updates the process status.
+            status_params (Dict[str, tuple]): Parameters for the status procedure.
+
+        Raises:
+            DatabaseError: If the batch fails. Neither the step data nor the status are saved then,
+                and the step data stays queued so a later flush can still write it.
+        """
+        calls = [(self.procedure_name, row) for row in self._rows]
+        calls.append((status_procedure, status_params))
+        sql_update_result = execute_stored_procedure_batch(self.conn_string, calls)
+        if not sql_update_result['success']:
+            raise DatabaseError(f"SQL - {self.procedure_name}/{status_procedure} failed.")
+        self._rows = []
 
 
 def log_and_raise_error(
@@ -84,41 +141,52 @@ def handle_database_error(
     raise exception
 
 
+_FORMS_QUERY = """
+    SELECT
+        j.form_id
+        ,f.form_data
+        ,CAST(f.form_submitted_date AS datetime) AS form_submitted_date
+    FROM
+        [RPA].[journalizing].[Journalizing] j
+    JOIN
+        [RPA].[journalizing].[Forms] f on f.form_id = j.form_id
+    WHERE
+        f.form_type = ?
+        AND j.status IS NULL
+    ORDER BY
+        f.form_submitted_date ASC
+"""
+
+
 def get_forms_data(conn_string: str, form_type: str, params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
-    """Retrieve the data for the specific form from the database."""
+    """
+    Retrieve the data for the specific form from the database.
+    The form type is passed as a parameter, so the statement text is the same for every form type
+    and SQL Server can reuse its plan.
+    """
     try:
-        query = f"""
-            SELECT
-                j.form_id
-                ,f.form_data
-                ,CAST(f.form_submitted_date AS datetime) AS form_submitted_date
-            FROM
-                [RPA].[journalizing].[Journalizing] j
-            JOIN
-                [RPA].[journalizing].[Forms] f on f.form_id = j.form_id
-            WHERE
-                f.form_type = '{form_type}'
-                AND j.status IS NULL
-            ORDER BY
-                f.form_submitted_date ASC
-        """
-        with pyodbc.connect(conn_string) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, params or [])
+        with get_connection(conn_string) as conn:
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(_FORMS_QUERY, [form_type, *(params or [])])
                 columns = [column[0] for column in cursor.description]
-                forms_data = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                forms_data = [dict(zip(columns, row)) for row in cursor]
         return forms_data
     except pyodbc.Error as e:
         raise SystemExit(e) from e
 
 
+@lru_cache(maxsize=4)
 def get_credentials_and_constants(orchestrator_connection: OrchestratorConnection) -> Dict[str, Any]:
-    """Retrieve necessary credentials and constants from the orchestrator connection."""
+    """
+    Retrieve necessary credentials and constants from the orchestrator connection.
+    The result is cached per orchestrator connection, as the values don't change during a run.
+    """
     try:
+        go_api_credential = orchestrator_connection.get_credential('go_api')
         credentials = {
             "go_api_endpoint": orchestrator_connection.get_constant('go_api_endpoint').value,
-            "go_api_username": orchestrator_connection.get_credential('go_api').username,
-            "go_api_password": orchestrator_connection.get_credential('go_api').password,
+            "go_api_username": go_api_credential.username,
+            "go_api_password": go_api_credential.password,
             "os2_api_key": orchestrator_connection.get_credential('os2_api').password,
             "sql_conn_string": orchestrator_connection.get_constant('DbConnectionString').value,
             "journalizing_tmp_path": orchestrator_connection.get_constant('journalizing_tmp_path').value,
@@ -132,33 +200,33 @@ def contact_lookup(
     case_handler,
     ssn: str,
     conn_string: str,
-    update_response_data: str,
+    step_recorder: StepRecorder,
     update_process_status: str,
     process_status_params_failed: str,
-    form_id: str
+    contact_cache: Optional[Dict[str, Tuple[str, str]]] = None
 ) -> Optional[Tuple[str, str]]:
     """
     Perform contact lookup and update the database with the contact information.
+    Contacts found earlier in the run are taken from contact_cache, if given, instead of the GO API.
 
     Returns:
         A tuple containing the person's full name and ID if successful, otherwise None.
     """
     try:
-        response = case_handler.contact_lookup(ssn, '/borgersager/_goapi/contacts/readitem')
-        if not response.ok:
-            raise RequestError("Request response failed.")
+        contact = contact_cache.get(ssn) if contact_cache is not None else None
+        if contact is None:
+            response = case_handler.contact_lookup(ssn, '/borgersager/_goapi/contacts/readitem')
+            if not response.ok:
+                raise RequestError("Request response failed.")
 
-        person_data = response.json()
-        person_full_name = person_data["FullName"]
-        person_go_id = person_data["ID"]
+            person_data = response.json()
+            contact = (person_data["FullName"], person_data["ID"])
+            if contact_cache is not None:
+                contact_cache[ssn] = contact
 
-        # SQL data update
-        sql_data_params = {
-            "StepName": ("str", "ContactLookup"),
-            "JsonFragment": ("str", json.dumps({"ContactId": person_go_id})),
-            "form_id": ("str", form_id)
-        }
-        execute_sql_update(conn_string, update_response_data, sql_data_params)
+        person_full_name, person_go_id = contact
+
+        step_recorder.record("ContactLookup", {"ContactId": person_go_id})
 
         return person_full_name, person_go_id
 
@@ -180,34 +248,35 @@ def check_case_folder(
     person_go_id: str,
     ssn: str,
     conn_string: str,
-    update_response_data: str,
+    step_recorder: StepRecorder,
     update_process_status: str,
     process_status_params_failed: str,
-    form_id: str
+    case_folder_cache: Optional[Dict[str, str]] = None
 ) -> Optional[str]:
     """
     Check if a case folder exists for the person and update the database.
+    Case folders found or created earlier in the run are taken from case_folder_cache, if given, instead of the GO API.
 
     Returns:
         The case folder ID if it exists, otherwise None.
     """
     try:
-        search_data = case_data_handler.search_case_folder_data_json(case_type, person_full_name, person_go_id, ssn)
-        response = case_handler.search_for_case_folder(search_data, '/_goapi/cases/findbycaseproperties')
+        case_folder_id = case_folder_cache.get(ssn) if case_folder_cache is not None else None
+        if case_folder_id is None:
+            search_data = case_data_handler.search_case_folder_data_json(case_type, person_full_name, person_go_id, ssn)
+            response = case_handler.search_for_case_folder(search_data, '/_goapi/cases/findbycaseproperties')
 
-        if not response.ok:
-            raise RequestError("Request response failed.")
+            if not response.ok:
+                raise RequestError("Request response failed.")
 
-        cases_info = response.json().get('CasesInfo', [])
-        case_folder_id = cases_info[0].get('CaseID') if cases_info else None
+            cases_info = response.json().get('CasesInfo', [])
+            case_folder_id = cases_info[0].get('CaseID') if cases_info else None
+            # Only existing folders are cached, as the folder may be created right after a miss
+            if case_folder_id and case_folder_cache is not None:
+                case_folder_cache[ssn] = case_folder_id
 
         if case_folder_id:
-            sql_data_params = {
-                "StepName": ("str", "CaseFolder"),
-                "JsonFragment": ("str", json.dumps({"CaseFolderId": case_folder_id})),
-                "form_id": ("str", form_id)
-            }
-            execute_sql_update(conn_string, update_response_data, sql_data_params)
+            step_recorder.record("CaseFolder", {"CaseFolderId": case_folder_id})
 
         return case_folder_id
 
@@ -228,13 +297,14 @@ def create_case_folder(
     person_go_id: str,
     ssn: str,
     conn_string: str,
-    update_response_data: str,
+    step_recorder: StepRecorder,
     update_process_status: str,
     process_status_params_failed: str,
-    form_id: str
+    case_folder_cache: Optional[Dict[str, str]] = None
 ) -> Optional[str]:
     """
     Create a new case folder if it doesn't exist.
+    The created folder is added to case_folder_cache, if given, so later forms for the person reuse it.
 
     Returns:
         Optional[str]: The case folder ID if created successfully, otherwise None in case of an error.
@@ -246,13 +316,10 @@ def create_case_folder(
             raise RequestError("Request response failed.")
 
         case_folder_id = response.json()['CaseID']
+        if case_folder_cache is not None:
+            case_folder_cache[ssn] = case_folder_id
 
-        sql_data_params = {
-            "StepName": ("str", "CaseFolder"),
-            "JsonFragment": ("str", json.dumps({"CaseFolderId": case_folder_id})),
-            "form_id": ("str", form_id)
-        }
-        execute_sql_update(conn_string, update_response_data, sql_data_params)
+        step_recorder.record("CaseFolder", {"CaseFolderId": case_folder_id})
 
         return case_folder_id
 
@@ -299,43 +366,54 @@ def create_case_data(
     )
 
 
-def determine_case_title(os2form_webform_id: str, person_full_name: str, ssn: str, parsed_form_data) -> str:
-    """Determine the title of the case based on the webform ID."""
-    match os2form_webform_id:
-        case "tilmelding_til_modersmaalsunderv":
-            return f"Modersmålsundervisning {person_full_name}"
-        case "anmeldelse_af_hjemmeundervisning":
-            return f"Hjemmeundervisning af {person_full_name}"
-        case "pasningstid":
-            return f"Modulændring/overflytning/indmeldelse ({person_full_name}, {ssn[:6]})"
-        case "indmeldelse_i_modtagelsesklasse":
-            return f"Visitering af {person_full_name} {ssn}"
-        case "ansoegning_om_koersel_af_skoleel" | "ansoegning_om_midlertidig_koerse":
-            return f"Kørsel til {person_full_name}"
-        case "indmeld_kraenkelser_af_boern" | "respekt_for_graenser_privat" | "respekt_for_graenser":
-            omraade = parsed_form_data['data']['omraade']
-            if omraade == "Skole":
-                department = parsed_form_data['data'].get('skole', "Ukendt skole")
-            elif omraade == "Dagtilbud":
-                department = parsed_form_data['data'].get('dagtilbud')
-                if not department:
-                    department = parsed_form_data['data'].get('daginstitution_udv_', "Ukendt dagtilbud")
-            elif omraade == "Ungdomsskole":
-                department = parsed_form_data['data'].get('ungdomsskole', "Ukendt ungdomsskole")
-            elif omraade == "Klub":
-                department = parsed_form_data['data'].get('klub', "Ukendt klub")
-            else:
-                department = "Ukendt afdeling"  # Default if no match
+_RESPEKT_FOR_GRAENSER_PART_TITLES = {
+    "indmeld_kraenkelser_af_boern": "Forældre/pårørendehenvendelse",
+    "respekt_for_graenser_privat": "Privat skole/privat dagtilbud-henvendelse",
+    "respekt_for_graenser": "BU-henvendelse",
+}
+
+
+def _respekt_for_graenser_title(os2form_webform_id: str, parsed_form_data) -> str:
+    """Build the case title of the 'respekt for grænser' forms from the department and form type."""
+    omraade = parsed_form_data['data']['omraade']
+    if omraade == "Skole":
+        department = parsed_form_data['data'].get('skole', "Ukendt skole")
+    elif omraade == "Dagtilbud":
+        department = parsed_form_data['data'].get('dagtilbud')
+        if not department:
+            department = parsed_form_data['data'].get('daginstitution_udv_', "Ukendt dagtilbud")
+    elif omraade == "Ungdomsskole":
+        department = parsed_form_data['data'].get('ungdomsskole', "Ukendt ungdomsskole")
+    elif omraade == "Klub":
+        department = parsed_form_data['data'].get('klub', "Ukendt klub")
+    else:
+        department = "Ukendt afdeling"  # Default if no match
+
+    part_title = _RESPEKT_FOR_GRAENSER_PART_TITLES.get(os2form_webform_id)
+
+    return f"{department} - {part_title}"
+
+
+# Case title builders per webform ID, called with (webform ID, full name, ssn, parsed form data)
+_CASE_TITLE_BUILDERS = {
+    "tilmelding_til_modersmaalsunderv": lambda _, name, ssn, data: f"Modersmålsundervisning {name}",
+    "anmeldelse_af_hjemmeundervisning": lambda _, name, ssn, data: f"Hjemmeundervisning af {name}",
+    "pasningstid": lambda _, name, ssn, data: f"Modulændring/overflytning/indmeldelse ({name}, {ssn[:6]})",
+    "indmeldelse_i_modtagelsesklasse": lambda _, name, ssn, data: f"Visitering af {name} {ssn}",
+    "ansoegning_om_koersel_af_skoleel": lambda _, name, ssn, data: f"Kørsel til {name}",
+    "ansoegning_om_midlertidig_koerse": lambda _, name, ssn, data: f"Kørsel til {name}",
+    **dict.fromkeys(
+        _RESPEKT_FOR_GRAENSER_PART_TITLES,
+        lambda webform_id, name, ssn, data: _respekt_for_graenser_title(webform_id, data)),
+}
 
-            part_title = None
-            if os2form_webform_id == "indmeld_kraenkelser_af_boern":
-                part_title = "Forældre/pårørendehenvendelse"
-            elif os2form_webform_id == "respekt_for_graenser_privat":
-                part_title = "Privat skole/privat dagtilbud-henvendelse"
-            elif os2form_webform_id == "respekt_for_graenser":
-                part_title = "BU-henvendelse"
 
-            return f"{department} - {part_title}"
+def determine_case_title(os2form_webform_id: str, person_full_name: str, ssn: str, parsed_form_data) -> str:
+    """Determine the title of the case based on the webform ID. Returns None for unknown webform IDs."""
+    title_builder = _CASE_TITLE_BUILDERS.get(os2form_webform_id)
+    if title_builder is None:
+        return None
+    return title_builder(os2form_webform_id, person_full_name, ssn, parsed_form_data)
 
 
 def determine_case_profile_id(case_profile_name: str, orchestrator_connection) -> str:
@@ -344,15 +422,17 @@ def determine_case_profile_id(case_profile_name: str, orchestrator_connection) -
         credentials = get_credentials_and_constants(orchestrator_connection)
         conn_string = credentials['sql_conn_string']
 
-        with pyodbc.connect(conn_string) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT case_profile_id FROM [RPA].[rpa].GO_CaseProfiles_View WHERE name like ?",
-                case_profile_name
-            )
-            row = cursor.fetchone()
-            if row:
-                return row[0]
+        with get_connection(conn_string) as conn:
+            # Close the cursor before the connection goes back to the pool, so no open result set is handed on
+            with closing(conn.cursor()) as cursor:
+                cursor.execute(
+                    "SELECT case_profile_id FROM [RPA].[rpa].GO_CaseProfiles_View WHERE name like ?",
+                    case_profile_name
+                )
+                row = cursor.fetchone()
+
+        if row:
+            return row[0]
 
         return None
 
@@ -398,10 +478,9 @@ def create_case(
     case_type: str,
     case_data: str,
     conn_string: str,
-    update_response_data: str,
+    step_recorder: StepRecorder,
     update_process_status: str,
     process_status_params_failed: str,
-    form_id: str,
     ssn: str = None,
     person_full_name: str = None,
     case_folder_id: str = None,
@@ -415,6 +494,8 @@ def create_case(
                         otherwise None in case of an error.
     """
     try:
+        # Copy, as the forms of a run are created concurrently from the same case metadata
+        case_data = dict(case_data)
         case_title = determine_case_title(os2form_webform_id, person_full_name, ssn, parsed_form_data)
         case_data['caseProfileId'], case_data['caseProfileName'] = determine_case_profile(
             os2form_webform_id,
@@ -432,21 +513,18 @@ def create_case(
             case_data['caseProfileId'],
             case_data['caseProfileName']
         )
-        print(f"Created case data: {created_case_data}")
         response = case_handler.create_case(created_case_data, '/_goapi/Cases')
         if not response.ok:
             print(f"Error creating case: {response.status_code} - {response.text}")
             raise RequestError("Request response failed.")
 
-        case_id = response.json()['CaseID']
-        case_rel_url = response.json()['CaseRelativeUrl']
+        case_info = response.json()
+        case_id = case_info['CaseID']
+        case_rel_url = case_info['CaseRelativeUrl']
 
-        sql_data_params = {
-            "StepName": ("str", "Case"),
-            "JsonFragment": ("str", json.dumps({"CaseId": case_id})),
-            "form_id": ("str", form_id)
-        }
-        execute_sql_update(conn_string, update_response_data, sql_data_params)
+        step_recorder.record("Case", {"CaseId": case_id})
+        # Write the ids of the citizen and the created case now, so they are kept if the robot stops during the uploads
+        step_recorder.flush()
         print(f"Case created with ID: {case_id}")
         return case_id, case_title, case_rel_url
 
@@ -476,81 +554,125 @@ def journalize_file(
     parsed_form_data: Dict[str, Any],
     os2_api_key: str,
     conn_string: str,
+    step_recorder: StepRecorder,
     process_status_params_failed: str,
-    form_id: str,
     case_metadata: str,
-    orchestrator_connection: OrchestratorConnection
+    orchestrator_connection: OrchestratorConnection,
+    document_executor: ThreadPoolExecutor
 ) -> None:
-    """Journalize associated files in the 'Document' folder under the citizen case."""
+    """
+    Journalize associated files in the 'Document' folder under the citizen case.
+    The attachments are transferred on document_executor, which is shared by all forms of the run.
+    """
 
-    def upload_single_document(url, received_date, document_category, wait_sec=5):
-        """N/A"""
-        filename = extract_filename_from_url(url)
-        filename_without_extension = extract_filename_from_url_without_extension(url)
+    def transfer_document(url, filename, document_category, create_metadata, keep_bytes, wait_sec=5):
+        """
+        Download a file and upload it to the case, retrying failed uploads.
+        Returns the last response, the number of upload attempts and the file content if keep_bytes is set.
+        """
         file_bytes = download_file_bytes(url, os2_api_key)
-        upload_status = "failed"
+        document_data = create_metadata(
+            filename=filename,
+            data_in_bytes=file_bytes,
+            document_title=os.path.splitext(filename)[0],
+            document_category=document_category
+        )
         upload_attempts = 0
 
-        while upload_status == "failed" and upload_attempts < 5:
-            document_data = document_handler.create_document_metadata(
-                case_id=case_id,
-                filename=filename,
-                data_in_bytes=list(file_bytes),
-                document_date=received_date,
-                document_title=filename_without_extension,
-                document_receiver="",
-                document_category=document_category,
-                overwrite="true"
-            )
-
+        while upload_attempts < 5:
             response = document_handler.upload_document(document_data, '/_goapi/Documents/AddToCase')
 
             upload_attempts += 1
             if response.ok:
-                upload_status = "succeeded"
-            else:
-                time.sleep(wait_sec)
+                break
+            time.sleep(wait_sec)
 
-        attempts_string = f"{upload_attempts} attempt"
-        attempts_string += "s" if upload_attempts > 1 else ""
-        orchestrator_connection.log_trace(f"Uploading {filename} {upload_status} after {attempts_string}")
+        return response, upload_attempts, file_bytes if keep_bytes else None
 
-        if not response.ok:
-            log_and_raise_error(
-                orchestrator_connection,
-                "An error occurred when uploading the document.",
-                RequestError("Request response failed.")
-            )
-
-        document_id = response.json()["DocId"]
-        orchestrator_connection.log_trace(f"Document uploaded with ID: {document_id}")
-        return {"DocumentId": str(document_id)}, document_id, file_bytes
+    def record_running_uploads(transfers, documents):
+        """Wait for the transfers that could not be cancelled and add the documents they uploaded."""
+        for _, future in transfers:
+            if future.cancelled() or future.exception() is not None:
+                continue
+            response = future.result()[0]
+            if response.ok:
+                documents.append({"DocumentId": str(response.json()["DocId"])})
 
-    def process_documents(wait_sec=3):
-        """N/A"""
+    def process_documents():
+        """
+        Transfer the attachments of the form concurrently and check the results in form order.
+        At most config.MAX_DOCUMENT_WORKERS transfers are submitted at a time, and a transfer is only
+        submitted once the oldest one is checked, so the files of the form are not all held in memory.
+        Only the content of the last attachment is kept, as it is sent with the notification mail.
+        """
         urls = find_name_url_pairs(parsed_form_data)
-        document_category_json = extract_key_value_pairs_from_json(
-            case_metadata['documentData'],
-            node_name="documentCategory")
-        received_date = (
-            parsed_form_data['entity']['completed'][0]['value']
-            if case_metadata['documentData']['useCompletedDateFromFormAsDate'] == "True"
-            else ""
-        )
+        document_category_json = case_metadata['documentCategories']
+        received_date = parsed_form_data['entity']['completed'][0]['value'] if use_completed_date else ""
+
+        url_list = list(urls.values())
+        filenames = [extract_filename_from_url(url) for url in url_list]
+        document_categories = [document_category_json.get(name, 'Indgående') for name in urls]
+        # The metadata that is the same for every document of the case
+        create_metadata = partial(
+            document_handler.create_document_metadata,
+            case_id=case_id,
+            document_date=received_date,
+            document_receiver="",
+            overwrite="true")
 
         documents, document_ids = [], []
-        for name, url in urls.items():
-            document_category = document_category_json.get(name, 'Indgående')
-            doc, doc_id, file_bytes = upload_single_document(url, received_date, document_category)
-            documents.append(doc)
-            document_ids.append(doc_id)
-            time.sleep(wait_sec)
+        file_bytes = None
+        pending = enumerate(zip(url_list, filenames, document_categories))
+        last_index = len(url_list) - 1
+        transfers = deque()
+
+        def submit_next():
+            item = next(pending, None)
+            if item is not None:
+                index, (url, filename, document_category) = item
+                future = document_executor.submit(
+                    transfer_document, url, filename, document_category, create_metadata, index == last_index)
+                transfers.append((filename, future))
+
+        try:
+            for _ in range(config.MAX_DOCUMENT_WORKERS):
+                submit_next()
+
+            while transfers:
+                filename, future = transfers.popleft()
+                response, upload_attempts, file_bytes = future.result()
+                attempts_string = f"{upload_attempts} attempt"
+                attempts_string += "s" if upload_attempts > 1 else ""
+
+                if not response.ok:
+                    orchestrator_connection.log_trace(f"Uploading {filename} failed after {attempts_string}")
+                    log_and_raise_error(
+                        orchestrator_connection,
+                        "An error occurred when uploading the document.",
+                        RequestError("Request response failed.")
+                    )
+
+                document_id = response.json()["DocId"]
+                # One trace per document, as every log call is a write to the orchestrator database
+                orchestrator_connection.log_trace(
+                    f"Uploading {filename} succeeded after {attempts_string}. Document ID: {document_id}")
+                documents.append({"DocumentId": str(document_id)})
+                document_ids.append(document_id)
+                submit_next()
+        except Exception:
+            # Stop the transfers that have not started, so nothing is uploaded to the case after the failure
+            for _, future in transfers:
+                future.cancel()
+            record_running_uploads(transfers, documents)
+            if documents:
+                step_recorder.record("Case Files", documents)
+                step_recorder.flush()
+            raise
 
         return documents, document_ids, file_bytes
 
-    def handle_journalization(document_ids, file_bytes):
-        if case_metadata['documentData'].get('journalizeDocuments') == "True":
-            orchestrator_connection.log_trace("Journalizing document.")
+    def handle_journalization(document_ids):
+        if do_journalize:
             response = document_handler.journalize_document(
                 document_ids,
                 '/_goapi/Documents/MarkMultipleAsCaseRecord/ByDocumentId')
@@ -561,18 +683,9 @@ def journalize_file(
                     RequestError("Request response failed.")
                 )
             orchestrator_connection.log_trace("Document was journalized.")
-            notify_stakeholders(
-                case_metadata,
-                case_id,
-                case_title,
-                case_rel_url,
-                orchestrator_connection,
-                False,
-                file_bytes)
 
     def handle_finalization(document_ids):
-        if case_metadata['documentData'].get('finalizeDocuments') == "True":
-            orchestrator_connection.log_trace("Finalizing document.")
+        if do_finalize:
             response = document_handler.finalize_document(
                 document_ids,
                 '/_goapi/Documents/FinalizeMultiple/ByDocumentId')
@@ -584,19 +697,30 @@ def journalize_file(
             orchestrator_connection.log_trace("Document was finalized.")
 
     try:
-        orchestrator_connection.log_trace("Uploading document(s) to the case.")
+        document_data = case_metadata['documentData']
+        # The flags are only on when set to exactly "True" in the metadata
+        use_completed_date = document_data['useCompletedDateFromFormAsDate'] == "True"
+        do_journalize = document_data.get('journalizeDocuments') == "True"
+        do_finalize = document_data.get('finalizeDocuments') == "True"
+
         documents, document_ids, file_bytes = process_documents()
 
-        sql_data_params = {
-            "StepName": ("str", "Case Files"),
-            "JsonFragment": ("str", json.dumps(documents)),
-            "form_id": ("str", form_id)
-        }
-        execute_sql_update(conn_string, case_metadata['spUpdateResponseData'], sql_data_params)
+        step_recorder.record("Case Files", documents)
 
-        handle_journalization(document_ids, file_bytes)
+        # Finalize right after journalizing, so both calls reuse the open connection before the mail is sent
+        handle_journalization(document_ids)
         handle_finalization(document_ids)
 
+        if do_journalize:
+            notify_stakeholders(
+                case_metadata,
+                case_id,
+                case_title,
+                case_rel_url,
+                orchestrator_connection,
+                False,
+                file_bytes)
+
     except (DatabaseError, RequestError) as e:
         print(f"An error occurred: {e}")
         handle_database_error(conn_string, case_metadata['spUpdateProcessStatus'], process_status_params_failed, e)
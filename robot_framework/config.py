@@ -11,6 +11,18 @@ SMTP_SERVER = "smtp.aarhuskommune.local"
 SMTP_PORT = 25
 SCREENSHOT_SENDER = "robot@friend.dk"
 
+# The maximum number of idle database connections kept open per connection string
+DB_POOL_SIZE = 25
+
+# The number of forms that are journalized at the same time
+MAX_FORM_WORKERS = 4
+
+# The number of attachments of a form that are downloaded/uploaded at the same time
+MAX_DOCUMENT_WORKERS = 4
+
+# The maximum number of keep-alive HTTP connections kept open per host by each thread's session
+HTTP_POOL_SIZE = 4
+
 # Constant/Credential names
 ERROR_EMAIL = "Error Email"
 
@@ -1,21 +1,50 @@
 """This module contains the main process of the robot."""
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from functools import partial
 
+import orjson
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 
-from mbu_dev_shared_components.utils.db_stored_procedure_executor import execute_stored_procedure
 from mbu_dev_shared_components.getorganized.objects import CaseDataJson
 
+from robot_framework import config
 from robot_framework.case_manager.case_handler import CaseHandler
+from robot_framework.case_manager.database import execute_stored_procedure
 from robot_framework.case_manager.document_handler import DocumentHandler
 from robot_framework.case_manager import journalize_process as jp
 from robot_framework.case_manager.helper_functions import fetch_case_metadata, notify_stakeholders
 
 
+_CITIZEN_FOLDER_LOCKS_GUARD = threading.Lock()
+_THREAD_HANDLERS = threading.local()
+
+# The (type, value) status parameters for in progress, successful and failed forms
+_PROCESS_STATUSES = (("str", "InProgress"), ("str", "Successful"), ("str", "Failed"))
+
+# Webforms whose SSN is read from the first of the fields below that is present in the form data
+_CHILD_SSN_WEBFORMS = frozenset({
+    "tilmelding_til_modersmaalsunderv",
+    "indmeldelse_i_modtagelsesklasse",
+    "ansoegning_om_koersel_af_skoleel",
+    "ansoegning_om_midlertidig_koerse"})
+_CHILD_SSN_FIELDS = (
+    "cpr_barnets_nummer",
+    "barnets_cpr_nummer",
+    "cpr_elevens_nummer",
+    "elevens_cpr_nummer",
+    "cpr_barnet")
+# Webforms whose SSN comes from MitID or, if that is empty, from the manually entered field
+_MITID_OR_MANUAL_SSN_FIELDS = {
+    "anmeldelse_af_hjemmeundervisning": ("barnets_cpr_nummer_mitid", "cpr_barnets_nummer_"),
+    "pasningstid": ("barnets_cpr_nummer", "cpr_barnets_nummer_")}
+
+
 def process(orchestrator_connection: OrchestratorConnection) -> None:
     """Do the primary process of the robot."""
     orchestrator_connection.log_trace("Running process.")
-    oc_args_json = json.loads(orchestrator_connection.process_arguments)
+    oc_args_json = orjson.loads(orchestrator_connection.process_arguments)
     os2formwebform_id = oc_args_json['os2formWebformId']
     credentials = jp.get_credentials_and_constants(orchestrator_connection)
     case_metadata = fetch_case_metadata(
@@ -23,100 +52,150 @@ def process(orchestrator_connection: OrchestratorConnection) -> None:
         os2formwebform_id=os2formwebform_id)
     forms_data = jp.get_forms_data(conn_string=credentials['sql_conn_string'], form_type=os2formwebform_id)
 
-    for form in forms_data:
-        case_handler = CaseHandler(
-            credentials['go_api_endpoint'],
-            credentials['go_api_username'],
-            credentials['go_api_password'])
-        case_data_handler = CaseDataJson()
-        document_handler = DocumentHandler(
-            credentials['go_api_endpoint'],
-            credentials['go_api_username'],
-            credentials['go_api_password'])
+    # The upload threads are shared by all forms of the run, so their HTTP sessions and NTLM auth are reused
+    with ThreadPoolExecutor(max_workers=config.MAX_DOCUMENT_WORKERS) as document_executor, \
+            ThreadPoolExecutor(max_workers=config.MAX_FORM_WORKERS) as executor:
+        list(executor.map(
+            partial(
+                _process_form,
+                orchestrator_connection=orchestrator_connection,
+                document_executor=document_executor,
+                os2formwebform_id=os2formwebform_id,
+                credentials=credentials,
+                case_metadata=case_metadata,
+                contact_cache={},
+                case_folder_cache={},
+                citizen_folder_locks={}),
+            forms_data))
+
+
+def _process_form(
+    form: dict,
+    orchestrator_connection: OrchestratorConnection,
+    document_executor: ThreadPoolExecutor,
+    os2formwebform_id: str,
+    credentials: dict,
+    case_metadata: dict,
+    contact_cache: dict,
+    case_folder_cache: dict,
+    citizen_folder_locks: dict
+) -> None:
+    """Journalize a single form. Runs in a worker thread and uses the API handlers of that thread."""
+    case_handler, case_data_handler, document_handler = _get_handlers(credentials)
+    conn_string = credentials['sql_conn_string']
+    status_procedure = case_metadata['spUpdateProcessStatus']
+    case_type = case_metadata['caseType']
 
-        form_id = form['form_id']
-        form_submitted_date = form['form_submitted_date']
-        parsed_form_data = json.loads(form['form_data'])
-        ssn = extract_ssn(os2formwebform_id=os2formwebform_id, parsed_form_data=parsed_form_data)
-        person_full_name = None
-        case_folder_id = None
+    form_id = form['form_id']
+    form_submitted_date = form['form_submitted_date']
+    person_full_name = None
+    case_folder_id = None
 
-        orchestrator_connection.log_trace(f"form_id: {form_id}")
-        orchestrator_connection.log_trace(f"form_submitted_date: {form_submitted_date}")
+    # Every log call inserts a row in the orchestrator database, so the steps are logged once per form
+    form_log = {"form_id": form_id, "form_submitted_date": form_submitted_date, "steps": []}
 
-        status_params_inprogress, status_params_success, status_params_failed = get_status_params(form_id)
-        execute_stored_procedure(
-            credentials['sql_conn_string'],
-            case_metadata['spUpdateProcessStatus'],
-            status_params_inprogress)
+    status_params_inprogress, status_params_success, status_params_failed = get_status_params(form_id)
+    # Set per form, not for the whole run up front: forms are only picked up while their status is NULL,
+    # so a run that stops early must not leave the forms it never reached as in progress.
+    execute_stored_procedure(
+        conn_string,
+        status_procedure,
+        status_params_inprogress)
+    step_recorder = jp.StepRecorder(
+        conn_string,
+        case_metadata['spUpdateResponseData'],
+        form_id)
+
+    try:
+        form_log["steps"].append("Parse the form data.")
+        try:
+            parsed_form_data = orjson.loads(form['form_data'])
+            ssn = extract_ssn(os2formwebform_id=os2formwebform_id, parsed_form_data=parsed_form_data)
+        except Exception as e:
+            print(f"Error parsing the form data: {e}")
+            execute_stored_procedure(
+                conn_string,
+                status_procedure,
+                status_params_failed)
+            return
 
-        if case_metadata['caseType'] == "BOR":
-            orchestrator_connection.log_trace("Lookup the citizen.")
+        if case_type == "BOR":
+            if ssn is None:
+                # Without an SSN the citizen lookup can only fail, so don't call the GO API
+                print("No SSN found in the form data.")
+                execute_stored_procedure(
+                    conn_string,
+                    status_procedure,
+                    status_params_failed)
+                return
+
+            form_log["steps"].append("Lookup the citizen.")
             try:
                 person_full_name, person_go_id = jp.contact_lookup(
                     case_handler=case_handler,
                     ssn=ssn,
-                    conn_string=credentials['sql_conn_string'],
-                    update_response_data=case_metadata['spUpdateResponseData'],
-                    update_process_status=case_metadata['spUpdateProcessStatus'],
+                    conn_string=conn_string,
+                    step_recorder=step_recorder,
+                    update_process_status=status_procedure,
                     process_status_params_failed=status_params_failed,
-                    form_id=form_id
+                    contact_cache=contact_cache
                 )
             except Exception:
                 print("Error looking up the citizen.")
-                continue
+                return
 
-            orchestrator_connection.log_trace("Check for existing citizen folder.")
-            try:
-                case_folder_id = jp.check_case_folder(
-                    case_handler=case_handler,
-                    case_data_handler=case_data_handler,
-                    case_type=case_metadata['caseType'],
-                    person_full_name=person_full_name,
-                    person_go_id=person_go_id,
-                    ssn=ssn,
-                    conn_string=credentials['sql_conn_string'],
-                    update_response_data=case_metadata['spUpdateResponseData'],
-                    update_process_status=case_metadata['spUpdateProcessStatus'],
-                    process_status_params_failed=status_params_failed,
-                    form_id=form_id
-                )
-            except Exception:
-                continue
-
-            if not case_folder_id:
-                orchestrator_connection.log_trace("Create citizen folder.")
+            # Forms for the same citizen must not both find no folder and create one each
+            with _citizen_folder_lock(citizen_folder_locks, ssn):
+                form_log["steps"].append("Check for existing citizen folder.")
                 try:
-                    case_folder_id = jp.create_case_folder(
+                    case_folder_id = jp.check_case_folder(
                         case_handler=case_handler,
-                        case_type=case_metadata['caseType'],
+                        case_data_handler=case_data_handler,
+                        case_type=case_type,
                         person_full_name=person_full_name,
                         person_go_id=person_go_id,
                         ssn=ssn,
-                        conn_string=credentials['sql_conn_string'],
-                        update_response_data=case_metadata['spUpdateResponseData'],
-                        update_process_status=case_metadata['spUpdateProcessStatus'],
+                        conn_string=conn_string,
+                        step_recorder=step_recorder,
+                        update_process_status=status_procedure,
                         process_status_params_failed=status_params_failed,
-                        form_id=form_id
+                        case_folder_cache=case_folder_cache
                     )
                 except Exception:
-                    print("Error creating citizen folder.")
-                    continue
+                    return
 
-        orchestrator_connection.log_trace("Create case.")
+                if not case_folder_id:
+                    form_log["steps"].append("Create citizen folder.")
+                    try:
+                        case_folder_id = jp.create_case_folder(
+                            case_handler=case_handler,
+                            case_type=case_type,
+                            person_full_name=person_full_name,
+                            person_go_id=person_go_id,
+                            ssn=ssn,
+                            conn_string=conn_string,
+                            step_recorder=step_recorder,
+                            update_process_status=status_procedure,
+                            process_status_params_failed=status_params_failed,
+                            case_folder_cache=case_folder_cache
+                        )
+                    except Exception:
+                        print("Error creating citizen folder.")
+                        return
+
+        form_log["steps"].append("Create case.")
         try:
             case_id, case_title, case_rel_url = jp.create_case(
                 case_handler=case_handler,
                 orchestrator_connection=orchestrator_connection,
                 parsed_form_data=parsed_form_data,
                 os2form_webform_id=os2formwebform_id,
-                case_type=case_metadata['caseType'],
+                case_type=case_type,
                 case_data=case_metadata['caseData'],
-                conn_string=credentials['sql_conn_string'],
-                update_response_data=case_metadata['spUpdateResponseData'],
-                update_process_status=case_metadata['spUpdateProcessStatus'],
+                conn_string=conn_string,
+                step_recorder=step_recorder,
+                update_process_status=status_procedure,
                 process_status_params_failed=status_params_failed,
-                form_id=form_id,
                 ssn=ssn,
                 person_full_name=person_full_name,
                 case_folder_id=case_folder_id
@@ -125,9 +204,9 @@ def process(orchestrator_connection: OrchestratorConnection) -> None:
             message = f"Error creating case: {e}"
             print(message)
             notify_stakeholders(case_metadata, None, None, None, orchestrator_connection, message, None)
-            continue
+            return
 
-        orchestrator_connection.log_trace("Journalize files.")
+        form_log["steps"].append("Journalize files.")
         try:
             jp.journalize_file(
                 document_handler=document_handler,
@@ -136,11 +215,12 @@ def process(orchestrator_connection: OrchestratorConnection) -> None:
                 case_rel_url=case_rel_url,
                 parsed_form_data=parsed_form_data,
                 os2_api_key=credentials['os2_api_key'],
-                conn_string=credentials['sql_conn_string'],
+                conn_string=conn_string,
+                step_recorder=step_recorder,
                 process_status_params_failed=status_params_failed,
-                form_id=form_id,
                 case_metadata=case_metadata,
-                orchestrator_connection=orchestrator_connection
+                orchestrator_connection=orchestrator_connection,
+                document_executor=document_executor
             )
         except Exception as e:
             message = f"Error journalizing files. {e}"
@@ -153,21 +233,57 @@ def process(orchestrator_connection: OrchestratorConnection) -> None:
                 orchestrator_connection=orchestrator_connection,
                 error_message=message,
                 attachment_bytes=None)
-            continue
+            return
 
-        execute_stored_procedure(
-            credentials['sql_conn_string'],
-            case_metadata['spUpdateProcessStatus'],
-            status_params_success)
+        try:
+            step_recorder.complete(status_procedure, status_params_success)
+        except jp.DatabaseError as e:
+            message = f"Error saving step data. {e}"
+            print(message)
+            execute_stored_procedure(
+                conn_string,
+                status_procedure,
+                status_params_failed)
+    finally:
+        # Save the step data of failed forms as well. Errors here are already reported by the failure status.
+        with suppress(jp.DatabaseError):
+            step_recorder.flush()
+        orchestrator_connection.log_trace(orjson.dumps(form_log).decode())
+
+
+def _get_handlers(credentials: dict) -> tuple:
+    """
+    Return the API handlers of the current worker thread, creating them on first use.
+    The handlers hold no per-form state, so each thread reuses them for all its forms.
+    """
+    if not hasattr(_THREAD_HANDLERS, "case_handler"):
+        _THREAD_HANDLERS.case_handler = CaseHandler(
+            credentials['go_api_endpoint'],
+            credentials['go_api_username'],
+            credentials['go_api_password'])
+        _THREAD_HANDLERS.case_data_handler = CaseDataJson()
+        _THREAD_HANDLERS.document_handler = DocumentHandler(
+            credentials['go_api_endpoint'],
+            credentials['go_api_username'],
+            credentials['go_api_password'])
+    return _THREAD_HANDLERS.case_handler, _THREAD_HANDLERS.case_data_handler, _THREAD_HANDLERS.document_handler
+
+
+def _citizen_folder_lock(citizen_folder_locks: dict, ssn: str) -> threading.Lock:
+    """
+    Return the lock that serializes the citizen folder lookup and creation for the given SSN.
+    The locks are kept in a dict that lives for one run only, so no SSNs are held after the run.
+    """
+    with _CITIZEN_FOLDER_LOCKS_GUARD:
+        return citizen_folder_locks.setdefault(ssn, threading.Lock())
 
 
 def get_status_params(form_id: str):
     """
-    Generates a set of status parameters for the process, based on the given form_id and JSON arguments.
+    Generates a set of status parameters for the process, based on the given form_id.
 
     Args:
         form_id (str): The unique identifier for the current process.
-        case_metadata (dict): A dictionary containing various process-related arguments, including table names.
 
     Returns:
         tuple: A tuple containing three dictionaries:
@@ -175,19 +291,8 @@ def get_status_params(form_id: str):
             - status_params_success: Parameters indicating that the process completed successfully.
             - status_params_failed: Parameters indicating that the process has failed.
     """
-    status_params_inprogress = {
-        "Status": ("str", "InProgress"),
-        "form_id": ("str", f'{form_id}')
-    }
-    status_params_success = {
-        "Status": ("str", "Successful"),
-        "form_id": ("str", f'{form_id}')
-    }
-    status_params_failed = {
-        "Status": ("str", "Failed"),
-        "form_id": ("str", f'{form_id}')
-    }
-    return status_params_inprogress, status_params_success, status_params_failed
+    form_id_param = ("str", form_id)
+    return tuple({"Status": status, "form_id": form_id_param} for status in _PROCESS_STATUSES)
 
 
 def extract_ssn(os2formwebform_id, parsed_form_data):
@@ -202,32 +307,15 @@ def extract_ssn(os2formwebform_id, parsed_form_data):
         str or None: The extracted SSN as a string with hyphens removed,
             or None if the SSN is not present in the form data.
     """
-    match os2formwebform_id:
-        case (
-          "tilmelding_til_modersmaalsunderv" |
-          "indmeldelse_i_modtagelsesklasse" |
-          "ansoegning_om_koersel_af_skoleel" |
-          "ansoegning_om_midlertidig_koerse"):
-            if 'cpr_barnets_nummer' in parsed_form_data['data']:
-                return parsed_form_data['data']['cpr_barnets_nummer'].replace('-', '')
-            if 'barnets_cpr_nummer' in parsed_form_data['data']:
-                return parsed_form_data['data']['barnets_cpr_nummer'].replace('-', '')
-            if 'cpr_elevens_nummer' in parsed_form_data['data']:
-                return parsed_form_data['data']['cpr_elevens_nummer'].replace('-', '')
-            if 'elevens_cpr_nummer' in parsed_form_data['data']:
-                return parsed_form_data['data']['elevens_cpr_nummer'].replace('-', '')
-            if 'cpr_barnet' in parsed_form_data['data']:
-                return parsed_form_data['data']['cpr_barnet'].replace('-', '')
-            # TEST webform_id'er. Prod id i journalize_process.py
-        case "anmeldelse_af_hjemmeundervisning":
-            if parsed_form_data['data']['barnets_cpr_nummer_mitid'] != '':  # Hvis cpr kommer fra MitID
-                return parsed_form_data['data']['barnets_cpr_nummer_mitid'].replace('-', '')
-            if parsed_form_data['data']['cpr_barnets_nummer_'] != '':  # Hvis cpr er indtastet manuelt
-                return parsed_form_data['data']['cpr_barnets_nummer_'].replace('-', '')
-        case "pasningstid":
-            if parsed_form_data['data']['barnets_cpr_nummer'] != '':  # Hvis cpr kommer fra MitID
-                return parsed_form_data['data']['barnets_cpr_nummer'].replace('-', '')
-            if parsed_form_data['data']['cpr_barnets_nummer_'] != '':  # Hvis cpr er indtastet manuelt
-                return parsed_form_data['data']['cpr_barnets_nummer_'].replace('-', '')
-        case _:
-            return None
+    form_data = parsed_form_data.get('data', {})
+    if os2formwebform_id in _CHILD_SSN_WEBFORMS:
+        for field in _CHILD_SSN_FIELDS:
+            ssn = form_data.get(field)
+            if ssn is not None:
+                return ssn.replace('-', '')
+        return None
+    # TEST webform_id'er. Prod id i journalize_process.py
+    for field in _MITID_OR_MANUAL_SSN_FIELDS.get(os2formwebform_id, ()):
+        if form_data[field] != '':
+            return form_data[field].replace('-', '')
+    return None
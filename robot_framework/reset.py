@@ -2,6 +2,8 @@
 
 from OpenOrchestrator.orchestrator_connection.connection import OrchestratorConnection
 
+from robot_framework.case_manager import database
+
 
 def reset(orchestrator_connection: OrchestratorConnection) -> None:
     """Clean up, close/kill all programs and start them again. """
@@ -15,6 +17,7 @@ def reset(orchestrator_connection: OrchestratorConnection) -> None:
 def clean_up(orchestrator_connection: OrchestratorConnection) -> None:
     """Do any cleanup needed to leave a blank slate."""
     orchestrator_connection.log_trace("Doing cleanup.")
+    database.close_connections()
 
 
 def close_all(orchestrator_connection: OrchestratorConnection) -> None: